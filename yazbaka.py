@@ -1,11 +1,43 @@
 #!/usr/bin/python3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import argparse
+import functools
 import re
+import shutil
 import subprocess
-import sys
+import tempfile
 from selectors import SelectSelector
 
+# Format of the timestamp at the end of each Yazbaka snapshot (e.g. 2024-01-31_2359)
+_TIMESTAMP_FORMAT = "%Y-%m-%d_%H%M"
+_TIMESTAMP_LEN = len("YYYY-MM-DD_HHMM")
+
+# Flags that can be passed through to zfs send and zfs recv
+_SEND_ALLOWED = frozenset("DLPRbcehnpsvw")
+_RECV_ALLOWED = frozenset("FhMnsuv")
+
+# Pool features a destination needs to receive blocks compressed with each algorithm (zfs send -c)
+# "on" is treated as lz4, its default on any pool with lz4 enabled; other algorithms need no feature
+_COMPRESS_FEATURES = {'on': 'lz4_compress', 'lz4': 'lz4_compress', 'zstd': 'zstd_compress'}
+
+# Units accepted in time strings, mapped to a timedelta argument and a multiplier
+_UNITS = {
+    'm': ('minutes', 1), 'minute': ('minutes', 1), 'minutes': ('minutes', 1),
+    'h': ('hours', 1), 'hour': ('hours', 1), 'hours': ('hours', 1),
+    'd': ('days', 1), 'day': ('days', 1), 'days': ('days', 1),
+    'w': ('weeks', 1), 'week': ('weeks', 1), 'weeks': ('weeks', 1),
+    'mon': ('days', 31), 'month': ('days', 31), 'months': ('days', 31),  # Approximation for months
+    'y': ('days', 365), 'year': ('days', 365), 'years': ('days', 365),  # Approximation for years
+}
+
+# Patterns used throughout, compiled once
+_RE_TS_TAIL = re.compile(r"[0-9][0-9\-_T]*$")  # Timestamp at the end of a snapshot
+_RE_DATASET = re.compile(r"[^/]+/[^/]+.*")  # pool/dataset
+_RE_DURATION = re.compile(r"^(\d+)([a-zA-Z]*)$")  # Time string (e.g. 3h, 5days)
+_RE_MBUFFER_SIZE = re.compile(r"^[0-9]+[bkmgt%]?$", re.IGNORECASE)  # mbuffer buffer size (e.g. 1G, 512m, 50%)
+_RE_MBUFFER_BLOCK = re.compile(r"^[0-9]+[bkmgt]?$", re.IGNORECASE)  # mbuffer block size (e.g. 128k)
+
 
 class ZFSError(IOError):
     pass
@@ -25,15 +57,22 @@ class Yazbaka:
         Args:
             args: An argparse.Namespace object containing the command-line arguments.
         """
-        # Validate arguments if not already validated
-        if not hasattr(args, "validated") or not args.validated:
-            Yazbaka.validate_args(args, False)
+        Yazbaka.validate_args(args, False)  # Returns straight away if already validated
         self.args = args
         self.now = datetime.now()
         # Generate a timestamp in ISO format (YYYY-MM-DD_HHMM)
         self.timestamp = self.now.isoformat(timespec='minutes', sep="_").replace(":", "")
         self.snapshot_name = self.args.label + "_" + self.timestamp
         self.snaps = []
+        self._snap_cache = {}  # Yazbaka snapshots per dataset, see list_yaz_snapshots
+        self._written_rows = None  # (name, type, written) of the source tree, see _load_source_state
+        # Buffer between send and recv when mbuffer is available, otherwise a plain pipe
+        if shutil.which("mbuffer"):
+            self.mbuffer = ["mbuffer", "-q", "-s", self.args.mbuffer_block, "-m", self.args.mbuffer_size]
+            self._vprint(f"Using mbuffer: block size {self.args.mbuffer_block}, buffer size {self.args.mbuffer_size} per transfer")
+        else:
+            self.mbuffer = None
+            self._vprint("mbuffer not found: sending without a buffer")
 
     def has_changed(self):
         """
@@ -42,35 +81,31 @@ class Yazbaka:
         Returns:
             bool: True if a new snapshot is justified.
         """
-        cmd = ["zfs", "get", "-Hpr", "written", self.args.source]
-        res = subprocess.run(cmd, capture_output=True)
-        if res.returncode != 0:
-            raise ZFSError(res.stderr.decode())
+        if self._written_rows is None:
+            self._load_source_state()
 
         zero = True
         true_recursive = 'R' in self.args.send
         nested_dataset_slash = self.args.source + "/"
+        at_label = '@' + self.args.label
 
-        for line in res.stdout.splitlines():
-            line = line.decode()
-            elements  = line.split("\t")
-
-            if line.find(nested_dataset_slash) != -1 and not true_recursive:
+        for name, dataset_type, written in self._written_rows:
+            if name.startswith(nested_dataset_slash) and not true_recursive:
                 continue
 
             # If it's not a snapshot, any writing has been done since the last snapshot
-            if line.find('@') == -1:
-                if int(elements[2]) != 0:
+            if dataset_type != "snapshot":
+                if written != 0:
                     return True
                 else:
                     zero = True
                     continue
 
             # Disregard written value for yaz snaps, value is previous to current
-            if line.find('@' + self.args.label) != -1 :
+            if at_label in name:
                 zero = True
             else: #  Not a yazbaka snapshot, and writes count
-                if int(elements[2]) != 0:
+                if written != 0:
                     zero = False
 
         return not zero
@@ -79,10 +114,14 @@ class Yazbaka:
         """
         Performs the transfer using ZFS send/recv (incremental or new backup).
         """
-        if self.args.incremental or self.args.full_incremental:
-            return self.incremental_backup()
-        else:
-            return self.new_backup()
+        try:
+            if self.args.incremental or self.args.full_incremental:
+                return self.incremental_backup()
+            else:
+                return self.new_backup()
+        finally:
+            # The destination has new snapshots (or is in an unknown state on failure)
+            self._snap_cache.pop(self.args.destination, None)
 
     def new_backup(self):
         """
@@ -90,20 +129,11 @@ class Yazbaka:
         """
         try:
             last_snap = self.list_yaz_snapshots(self.args.source)[-1]
-            self.snapshot_name = re.search(r"(?<=@).*$", last_snap).group(0)
+            self.snapshot_name = last_snap.rpartition('@')[2]
         except:
             raise NoMatchingSnapshots("There are no snapshots tha can be sent")
 
-        send  = "zfs send " + self.args.send + " " + self.args.source + "@" + self.snapshot_name
-        recv = "zfs recv " + self.args.recv + " " + self.args.destination
-        cmd = send + " | " + recv
-
-        if self.args.verbose:
-            print(cmd)
-
-        res = subprocess.run(cmd, capture_output=True, shell=True)
-        if res.returncode != 0:
-            raise ZFSError(res.stderr.decode())
+        return self._send_snapshots(None, None, self.snapshot_name)
 
     def incremental_backup(self):
         """
@@ -120,70 +150,276 @@ class Yazbaka:
         src_start = self.args.source + "@" + pairs[-1]
         src_end = src[-1]
         if src_start == src_end:
-           return False
+            return False
             # raise NoMatchingSnapshots("There are no snapshots tha can be sent")
 
         if self.args.full_incremental:
-            iflag = " -I "
+            iflag = "-I"
         else:
-            iflag = " -i "
+            iflag = "-i"
 
-        send  = "zfs send " + self.args.send + iflag + src_start + " " + src_end
-        recv = "zfs recv " + self.args.recv + " " + self.args.destination
-        cmd = send + " | " + recv
+        return self._send_snapshots(iflag, pairs[-1], src_end.rpartition('@')[2])
 
-        if self.args.verbose:
-            print(cmd)
+    def _send_snapshots(self, iflag, start, end):
+        """
+        Sends the source to the destination, as a single stream or split per dataset (see _parallel_transfer).
+
+        Args:
+            iflag (str or None): The incremental flag (-i or -I), None for a full send.
+            start (str or None): The snapshot name (everything after the @) to start an incremental send from.
+            end (str): The snapshot name (everything after the @) to send.
 
-        res = subprocess.run(cmd, capture_output=True, shell=True)
+        Returns:
+            True: on a successful transfer
+
+        Raises:
+            ZFSError: If the transfer fails.
+        """
+        if self._is_parallel():
+            return self._parallel_transfer(iflag, start, end)
+
+        send = Yazbaka._send_argv(self.args.send, self.args.source, iflag, start, end)
+        return self._run_pipeline(send, self._recv_argv(self.args.destination))
+
+    def _is_parallel(self):
+        """
+        Checks if a recursive send should be split into parallel per dataset sends.
+
+        Returns:
+            bool: True if the recursive flag is set and more than one parallel transfer is allowed.
+        """
+        return 'R' in self.args.send and self.args.parallel > 1
+
+    def _parallel_transfer(self, iflag, start, end):
+        """
+        Sends the source and each of its children as individual streams instead of a single recursive one,
+        running up to --parallel send/recv pipelines at once. A stage must complete before the next one is
+        started so that parents are always received before their children.
+
+        To match what -R would have sent, properties are always included (-p), and a dataset sent in full (on a
+        full send, or a child that does not have the start snapshot) gets its oldest snapshot followed by every
+        snapshot up to the end one (-I). Datasets without the end snapshot are skipped along with everything
+        below them. Unlike -R, clones are not preserved: each clone is received as an independent copy of its data.
+
+        Args:
+            iflag (str or None): The incremental flag (-i or -I), None for a full send.
+            start (str): The snapshot name (everything after the @) to start an incremental send from.
+            end (str): The snapshot name (everything after the @) to send.
+
+        Returns:
+            True: on a successful transfer
+
+        Raises:
+            ZFSError: If any of the transfers fail, with the errors from every failed transfer in the stage, each
+                      prefixed with its dataset.
+        """
+        send_flags = self.args.send.replace("R", "")
+        if 'p' not in send_flags:
+            send_flags += "p"  # Implied by -R
+
+        # Snapshot names (everything after the @) of every dataset in the tree, oldest first
+        cmd = ["zfs", "list", "-H", "-o", "name", "-t", "snapshot", "-s", "createtxg", "-r", self.args.source]
+        res = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
         if res.returncode != 0:
-            raise ZFSError(res.stderr.decode())
+            raise ZFSError(res.stderr)
+        snapshots = {}
+        for line in res.stdout.splitlines():
+            dataset, _, name = line.partition("@")
+            snapshots.setdefault(dataset, []).append(name)
+
+        skipped = []
+        with ThreadPoolExecutor(max_workers=self.args.parallel) as executor:
+            for stage in Yazbaka._enumerate_children(self.args.source):
+                futures = []
+                for dataset in stage:
+                    # Like -R, skip datasets without the snapshot being sent, their children can't be received either
+                    if any(dataset.startswith(parent + "/") for parent in skipped):
+                        self._vprint(f"Parent of {dataset} was skipped: skipping {dataset}")
+                        skipped.append(dataset)
+                        continue
+                    dataset_snaps = snapshots.get(dataset, [])
+                    if end not in dataset_snaps:
+                        self._vprint(f"{dataset}@{end} does not exist: skipping {dataset}")
+                        skipped.append(dataset)
+                        continue
+
+                    if iflag and start in dataset_snaps:
+                        sends = [Yazbaka._send_argv(send_flags, dataset, iflag, start, end)]
+                    else:
+                        if iflag:
+                            self._vprint(f"{dataset}@{start} does not exist: sending {dataset} in full")
+                        # Send the oldest snapshot in full, then everything up to the end snapshot on top of it
+                        oldest = dataset_snaps[0]
+                        sends = [Yazbaka._send_argv(send_flags, dataset, None, None, oldest)]
+                        if oldest != end:
+                            sends.append(Yazbaka._send_argv(send_flags, dataset, "-I", oldest, end))
+
+                    recv = self._recv_argv(self.args.destination + dataset[len(self.args.source):])
+                    futures.append((dataset, executor.submit(self._run_pipelines, sends, recv)))
+
+                errors = []
+                for dataset, future in futures:
+                    error = future.exception()
+                    if error is None:
+                        continue
+                    if not isinstance(error, ZFSError):
+                        raise error  # Not a failed transfer (e.g. zfs could not be run), keep its type and traceback
+                    errors.append(f"{dataset}: {str(error).strip()}")
+                if errors:
+                    raise ZFSError("\n".join(errors))
+
+        return True
+
+    def _run_pipelines(self, send_argvs, recv_argv):
+        """
+        Runs several zfs sends one after the other, each into its own run of the same zfs recv command.
+
+        Args:
+            send_argvs (list): The zfs send commands, in the order they must be received.
+            recv_argv (list): The zfs recv command.
+
+        Returns:
+            True: on a successful transfer
 
+        Raises:
+            ZFSError: If any of the pipelines fail, the remaining sends are not attempted.
+        """
+        for send_argv in send_argvs:
+            self._run_pipeline(send_argv, recv_argv)
         return True
 
+    def _run_pipeline(self, send_argv, recv_argv):
+        """
+        Streams zfs send straight into zfs recv (through mbuffer if available) without going through a shell.
+        The stream itself is never read by Python, only the errors are collected.
+
+        Args:
+            send_argv (list): The zfs send command.
+            recv_argv (list): The zfs recv command.
+
+        Returns:
+            True: on a successful transfer
+
+        Raises:
+            ZFSError: If any process in the pipeline fails, with the combined stderr of the pipeline.
+        """
+        cmds = [send_argv, self.mbuffer, recv_argv] if self.mbuffer else [send_argv, recv_argv]
+        self._vprint(" | ".join(" ".join(cmd) for cmd in cmds))
+
+        # stderr goes to a file rather than a pipe so a chatty process (e.g. zfs send -v) can never stall on it
+        with tempfile.TemporaryFile(mode="w+") as errors:
+            procs = []
+            stdin = subprocess.DEVNULL
+            try:
+                for cmd in cmds:
+                    stdout = None if cmd is recv_argv else subprocess.PIPE
+                    procs.append(subprocess.Popen(cmd, stdin=stdin, stdout=stdout, stderr=errors))
+                    if cmd is not send_argv:
+                        stdin.close()  # Only the next process in the pipeline keeps the read end open
+                    stdin = procs[-1].stdout
+            except BaseException:
+                # A later command could not be started, don't leave the earlier ones blocked on their output
+                if stdin is not subprocess.DEVNULL:
+                    stdin.close()
+                for proc in procs:
+                    proc.kill()
+                    proc.wait()
+                raise
+
+            returncodes = [proc.wait() for proc in procs]
+            if any(returncodes):
+                errors.seek(0)
+                raise ZFSError(errors.read())
+
+        return True
 
     @staticmethod
-    def get_pairs(src, dest):
+    def _send_argv(flags, dataset, iflag, start, end):
         """
-        Compares two lists of snapshot names to find common snapshots based on their timestamp.
+        Builds a zfs send command for dataset@end, incremental from dataset@start when iflag is given.
 
         Args:
-            src (list): A list of source snapshot names.
-            dest (list): A list of destination snapshot names.
+            flags (str): Validated zfs send flags (e.g. "-Rc").
+            dataset (str): The ZFS dataset to send.
+            iflag (str or None): The incremental flag (-i or -I), None for a full send.
+            start (str or None): The snapshot name (everything after the @) to start an incremental send from.
+            end (str): The snapshot name (everything after the @) to send.
 
         Returns:
-            list: A list of matching snapshots names (everything after the @).
-        """
-        i = j = 0
-        pairs = []
-        while i < len(src) and j < len(dest):
-            cur_src = re.search(r"@.*$", src[i]).group(0)[1:]
-            cur_dest = re.search(r"@.*$", dest[j]).group(0)[1:]
-
-            if cur_src == cur_dest:
-                pairs.append(cur_src)
-                i += 1
-                j += 1
-                continue
+            list: The zfs send command.
+        """
+        if iflag:
+            return ["zfs", "send", *Yazbaka._flag_list(flags), iflag, dataset + "@" + start, dataset + "@" + end]
+        return ["zfs", "send", *Yazbaka._flag_list(flags), dataset + "@" + end]
 
-            src_stamp = Yazbaka._get_timestamp(cur_src)
-            dest_stamp = Yazbaka._get_timestamp(cur_dest)
+    def _recv_argv(self, dataset):
+        """
+        Builds a zfs recv command into the given dataset using the validated receive flags.
 
-            # Skip snapshots that don't contain a timestamp
-            if src_stamp is None:
-                i += 1
-                continue
-            if dest_stamp is None:
-                j += 1
-                continue
+        Args:
+            dataset (str): The ZFS dataset to receive into.
 
-            # Advance the pointer of the list with the older timestamp
-            if src_stamp < dest_stamp:
-                i += 1
-            else:
-                j += 1
+        Returns:
+            list: The zfs recv command.
+        """
+        return ["zfs", "recv", *Yazbaka._flag_list(self.args.recv), dataset]
+
+    @staticmethod
+    def _flag_list(flags):
+        """
+        Converts validated zfs send/recv flags (e.g. "-Rc") into a list of arguments.
+
+        Args:
+            flags (str): The flags, optionally prefixed with a -.
+
+        Returns:
+            list: The flags as a single argument, or an empty list if there are none.
+        """
+        if flags in ("", "-"):
+            return []
+        return [flags]
+
+    @staticmethod
+    def _enumerate_children(dataset):
+        """
+        Lists a dataset and all of its children, grouped into stages that can be received in parallel.
+        Each stage holds the datasets of a single depth so parents always come before their children.
+
+        Args:
+            dataset (str): The ZFS dataset to list.
+
+        Returns:
+            list: A list of stages, each a list of dataset names.
+
+        Raises:
+            ZFSError: If the zfs list command fails.
+        """
+        cmd = ["zfs", "list", "-Hr", "-o", "name", "-t", "filesystem,volume", dataset]
+        res = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        if res.returncode != 0:
+            raise ZFSError(res.stderr)
+
+        datasets = {}
+        for name in res.stdout.splitlines():
+            datasets.setdefault(name.count("/"), []).append(name)
+
+        return [datasets[depth] for depth in sorted(datasets)]
 
-        return pairs
+    @staticmethod
+    def get_pairs(src, dest):
+        """
+        Compares two lists of snapshot names to find the snapshots common to both.
+
+        Args:
+            src (list): A list of source snapshot names.
+            dest (list): A list of destination snapshot names.
+
+        Returns:
+            list: A list of matching snapshots names (everything after the @), in the order of src.
+        """
+        src_names = [snap.partition("@")[2] for snap in src]
+        dest_names = {snap.partition("@")[2] for snap in dest}
+        return [name for name in src_names if name in dest_names]
 
     def conditional_snapshot(self):
         """
@@ -199,7 +435,8 @@ class Yazbaka:
                 print("Transfer only: omitting snapshot")
             return False
 
-        if (not self.has_changed()) and not self.args.no_omit_unchanged:
+        # With --no-omit-unchanged there is nothing to decide, so the written walk is skipped
+        if not self.args.no_omit_unchanged and not self.has_changed():
             if not self.args.quiet:
                 print("No change: omitting snapshot")
             return False
@@ -208,11 +445,19 @@ class Yazbaka:
             self.snaps = self.list_yaz_snapshots(self.args.source)
             if self.snaps:
                 last_snap = self.snaps[-1]
-                timestamp = re.search(r"[0-9][0-9\-_]*$", last_snap).group(0)
-                timestamp = timestamp[:-2] + ":" + timestamp[-2:]  # Format timestamp for datetime parsing
-
+                try:
+                    last_time = datetime.strptime(last_snap[-_TIMESTAMP_LEN:], _TIMESTAMP_FORMAT)
+                except ValueError:
+                    try:
+                        last_time = Yazbaka._get_datetime(last_snap)  # Snapshot names in an older format
+                    except ValueError:
+                        last_time = None
+
+                # A snapshot without a readable time can't be too recent
+                if last_time is None:
+                    self._vprint(f"Cannot read the time of {last_snap}: not omitting snapshot")
                 # If the last snapshot was taken within the 'omit' duration, skip
-                if self.args.omit > self.now - datetime.fromisoformat(timestamp):
+                elif self.args.omit > self.now - last_time:
                     if not self.args.quiet:
                         print("Too recent: omitting snapshot")
                     return False
@@ -240,12 +485,16 @@ class Yazbaka:
             print("Snapping...")
         if self.args.verbose:
             print(cmd)
-        res = subprocess.run(cmd, capture_output=True)
+        # Only stderr is of any use, and only on failure
+        res = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
 
         if res.returncode != 0:
-            if res.stderr.decode().find("permission denied"):
-                raise PermissionError(res.stderr.decode())
-            raise ZFSError(res.stderr.decode())
+            if "permission denied" in res.stderr:
+                raise PermissionError(res.stderr)
+            raise ZFSError(res.stderr)
+
+        if self.args.source in self._snap_cache:
+            self._snap_cache[self.args.source].append(self.args.source + "@" + self.snapshot_name)
 
         return True  # Indicate successful snapshot creation
 
@@ -268,6 +517,7 @@ class Yazbaka:
         self._destroy_before(src, last)
         if self.args.delete:
             self._destroy_before(dest, last)
+        self._snap_cache.clear()
 
         print("Feature incomplete not performing cleanup")
         return True
@@ -276,10 +526,21 @@ class Yazbaka:
         """
         Executes the main backup workflow: snapshot, transfer, and cleanup.
         """
-        self._nqprint(f"------------------{self.args.source} to {self.args.destination}------------------")
+        if self.args.snap_only:
+            self._nqprint(f"------------------{self.args.source}------------------")
+        else:
+            self._nqprint(f"------------------{self.args.source} to {self.args.destination}------------------")
 
-        if not self.conditional_snapshot():
-            self._nqprint("No snapshot needed")
+        if self.args.snap_only or not (self.args.incremental or self.args.full_incremental):
+            if not self.conditional_snapshot():
+                self._nqprint("No snapshot needed")
+        else:
+            # List the destination snapshots for the incremental send while the source is being snapped
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                dest_snaps = executor.submit(self.list_yaz_snapshots, self.args.destination)
+                if not self.conditional_snapshot():
+                    self._nqprint("No snapshot needed")
+                dest_snaps.result()  # Raise any error from listing the destination
 
         if self.args.snap_only:
             return
@@ -293,6 +554,7 @@ class Yazbaka:
             self.cleanup()
 
     @staticmethod
+    @functools.lru_cache(maxsize=32)
     def _get_timedelta(time_str):
         """
         Converts a time string (e.g., "3h", "5days") into a timedelta object.
@@ -306,33 +568,17 @@ class Yazbaka:
         Raises:
             ValueError: If the time string format is invalid.
         """
-        match = re.match(r"^[0-9]*", time_str)  # Extract the numeric part
-        if match:
-            num_str = match.group(0)
-            num = int(num_str)
-            spec_str = time_str[len(num_str):]  # Extract the unit part
-
-            # Convert to timedelta based on the unit
-            if  spec_str in ['m', 'minute', 'minutes']:
-                return timedelta(minutes=num)
-            elif spec_str in ['h', 'hour', 'hours']:
-                return timedelta(hours=num)
-            elif spec_str in ['d', 'day', 'days']:
-                return timedelta(days=num)
-            elif spec_str in ['w', 'week', 'weeks']:
-                return timedelta(weeks=num)
-            elif spec_str in ['mon', 'month', 'months']:
-                return timedelta(days=num * 31)  # Approximation for months
-            elif spec_str in ['y', 'year', 'years']:
-                return timedelta(days=num * 365)  # Approximation for years
-            else:
-                raise ValueError("Invalid time format. Use -h for help.")
-        else:
+        match = _RE_DURATION.match(time_str)
+        if not match or match.group(2) not in _UNITS:
             raise ValueError("Invalid time format. Use -h for help.")
 
+        unit, multiplier = _UNITS[match.group(2)]
+        return timedelta(**{unit: int(match.group(1)) * multiplier})
+
     def list_yaz_snapshots(self, dataset):
         """
-        Lists snapshots created by Yazbaka for a specific dataset.
+        Lists snapshots created by Yazbaka for a specific dataset. The list is only fetched from ZFS on the first
+        call for each dataset and cached for the rest of the run.
 
         Args:
             dataset (str): The ZFS dataset to list snapshots for.
@@ -343,20 +589,54 @@ class Yazbaka:
         Raises:
             ZFSError: If the zfs list command fails.
         """
+        if dataset in self._snap_cache:
+            return self._snap_cache[dataset]
+
+        # The source snapshots come with the rest of the source state from a single zfs list
+        if dataset == self.args.source:
+            self._load_source_state()
+            return self._snap_cache[dataset]
+
         cmd = ["zfs", "list", "-H", "-t", "snapshot", dataset]
-        res = subprocess.run(cmd, capture_output=True)
+        res = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
         if res.returncode != 0:
-            raise ZFSError(res.stderr.decode())
+            raise ZFSError(res.stderr)
 
+        prefix = dataset + "@" + self.args.label
         snapshots = []
         for line in res.stdout.splitlines():
-            line = line.decode()
             # Filter for snapshots with the Yazbaka label
-            if line.find(dataset + "@" + self.args.label) != -1:
-                snapshots.append(re.match(r"^[^\t]*", line).group(0))  # Extract full snapshot name
+            if line.startswith(prefix):
+                snapshots.append(line.partition('\t')[0])  # Extract full snapshot name
 
+        self._snap_cache[dataset] = snapshots
         return snapshots
 
+    def _load_source_state(self):
+        """
+        Fetches everything needed about the source tree with one zfs list: the written value of every dataset and
+        snapshot (for has_changed) and the Yazbaka snapshots of the source (for list_yaz_snapshots).
+
+        Raises:
+            ZFSError: If the zfs list command fails.
+        """
+        cmd = ["zfs", "list", "-Hp", "-t", "filesystem,volume,snapshot", "-o", "name,type,written", "-r",
+               self.args.source]
+        res = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        if res.returncode != 0:
+            raise ZFSError(res.stderr)
+
+        yaz_prefix = self.args.source + "@" + self.args.label
+        self._written_rows = []
+        snapshots = []
+        for line in res.stdout.splitlines():
+            name, dataset_type, written = line.split("\t")
+            self._written_rows.append((name, dataset_type, int(written)))
+            if dataset_type == "snapshot" and name.startswith(yaz_prefix):
+                snapshots.append(name)
+
+        self._snap_cache[self.args.source] = snapshots
+
     @staticmethod
     def list_all_snapshots(dataset=None):
         """
@@ -372,21 +652,80 @@ class Yazbaka:
         if dataset:
             cmd.append(dataset)
 
-        res = subprocess.run(cmd, capture_output=True)
+        res = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        prefix = (dataset + "@") if dataset else None
         snapshots = []
         for line in res.stdout.splitlines():
-            line = line.decode()
-            if dataset is None:
-                snapshots.append(re.match(r"^[^\t]*", line).group(0))
-            elif line.find(dataset + "@") != -1:
-                snapshots.append(re.match(r"^[^\t]*", line).group(0))
+            if prefix is not None and not line.startswith(prefix):
+                continue
+            snapshots.append(line.partition('\t')[0])
 
         return snapshots
 
+    @staticmethod
+    def get_pool_features(pool):
+        """
+        Gets the state of the pool features relevant to compressed sends.
+
+        Args:
+            pool (str): The name of the ZFS pool.
+
+        Returns:
+            dict: Feature names (without the feature@ prefix) mapped to their state (e.g. enabled, active).
+                  Empty if the features could not be read.
+        """
+        cmd = ["zpool", "get", "-H", "-o", "property,value",
+               "feature@lz4_compress,feature@zstd_compress,feature@embedded_data,feature@large_blocks", pool]
+        features = {}
+        try:
+            res = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        except OSError:  # e.g. zpool is not installed
+            return features
+        if res.returncode != 0:
+            return features
+
+        for line in res.stdout.splitlines():
+            elements = line.split("\t")
+            features[elements[0].replace("feature@", "")] = elements[1]
+
+        return features
+
+    @staticmethod
+    def _can_send_compressed(dataset, recursive, features):
+        """
+        Checks if the dataset can be sent compressed (zfs send -c) to a pool with the given features, i.e. if the
+        destination supports every compression algorithm used by the dataset (and its children when recursive).
+
+        Args:
+            dataset (str): The ZFS dataset to send.
+            recursive (bool): True if the children of the dataset are sent too.
+            features (dict): The destination pool features, as returned by get_pool_features.
+
+        Returns:
+            bool: True if compressed blocks can be received, False if not or if the compression could not be read.
+        """
+        cmd = ["zfs", "get", "-H", "-o", "value", "-t", "filesystem,volume", "compression", dataset]
+        if recursive:
+            cmd.insert(2, "-r")
+        try:
+            res = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        except OSError:
+            return False
+        if res.returncode != 0:
+            return False
+
+        for compression in res.stdout.splitlines():
+            feature = _COMPRESS_FEATURES.get(compression.partition("-")[0])  # e.g. zstd-3 or gzip-9
+            if feature and features.get(feature) not in ('enabled', 'active'):
+                return False
+
+        return True
+
     @staticmethod
     def validate_args(args, exit_on_error=True):
         """
-        Validates and processes the command-line arguments provided to Yazbaka.
+        Validates and processes the command-line arguments provided to Yazbaka. Arguments that have already been
+        validated are left untouched, so this can safely be called more than once.
 
         Args:
             args: An argparse.Namespace object containing the command-line arguments.
@@ -395,6 +734,9 @@ class Yazbaka:
         Raises:
             ValueError: If validation fails and exit_on_error is False.
         """
+        if getattr(args, "validated", False):
+            return
+
         # Check for conflicting incremental arguments
         if args.full_incremental and  args.incremental:
             Yazbaka._exit_throw(exit_on_error,
@@ -402,52 +744,76 @@ class Yazbaka:
                                 "Conflicting arguments: full_incremental and incremental")
 
         # Validate zfs send flags
-        args.send = args.send.replace("'", "")
-        for flag in args.send:
-            if flag not in 'DLPRbcehnpsvw':
-                Yazbaka._exit_throw(exit_on_error,
-                    "Invalid send flag: %s! Type -h for options or consult the zfs-send man page." % flag,
-                    "Invalid send flag: %s" % flag)
-        if args.send:
-            args.send = "-" + args.send
+        bad = "".join(sorted(set(args.send) - _SEND_ALLOWED))
+        if bad:
+            Yazbaka._exit_throw(exit_on_error,
+                "Invalid send flags: %s! Type -h for options or consult the zfs-send man page." % bad,
+                "Invalid send flags: %s" % bad)
 
         # Validate zfs receive flags
-        args.recv = args.recv.replace("'", "")
-        for flag in args.recv:
-            if flag not in 'FhMnsuv':
-                Yazbaka._exit_throw(exit_on_error,
-                    "Invalid receive flag: %s! Type -h for options or consult the zfs-recv man page." % flag,
-                    "Invalid receive flag: %s" % flag)
+        bad = "".join(sorted(set(args.recv) - _RECV_ALLOWED))
+        if bad:
+            Yazbaka._exit_throw(exit_on_error,
+                "Invalid receive flags: %s! Type -h for options or consult the zfs-recv man page." % bad,
+                "Invalid receive flags: %s" % bad)
         if args.recv:
             args.recv = "-" + args.recv
 
         # Validate source dataset format
-        args.source = source = args.source.replace("'", "")
-        if not re.match(r"[^/]+/[^/]+.*", source):
+        source = args.source
+        if not _RE_DATASET.match(source):
             msg = "Source: %s does  not appear valid" % source
             Yazbaka._exit_throw(exit_on_error, msg, msg)
 
-        # Validate destination dataset format (if provided)
-        if hasattr(args, 'destination'):
-            args.destination = destination = args.destination.replace("'", "")
-            if not re.match("[^/]+/[^/]+.*", destination):
+        # Validate destination dataset format (required unless --snap-only is used)
+        if args.snap_only:
+            if args.destination is not None:
+                msg = "Destination should be omitted when using --snap-only"
+                Yazbaka._exit_throw(exit_on_error, msg + ", use -h for help", msg)
+            destination = "-" # Default for snap-only when destination is not required
+        elif args.destination is None:
+            msg = "Destination is required unless using --snap-only"
+            Yazbaka._exit_throw(exit_on_error, msg + ", use -h for help", msg)
+        else:
+            destination = args.destination
+            if not _RE_DATASET.match(destination):
                 msg = "Destination: %s does  not appear valid" % destination
                 Yazbaka._exit_throw(exit_on_error, msg, msg)
-        else:
-            destination = "-" # Default for snap-only or when destination is not required
 
         # Check if source or destination starts with '/'
         if source[0] == "/" or destination[0] == "/":
             msg = "Source and destination cannot start with '/'"
             Yazbaka._exit_throw(exit_on_error, msg , msg)
 
+        if args.parallel < 1:
+            msg = "Parallel: %d must be at least 1" % args.parallel
+            Yazbaka._exit_throw(exit_on_error, msg, msg)
+
         # Convert omit time string to timedelta object
         if args.omit:
-            args.omit = Yazbaka._get_timedelta(args.omit.replace("'", ""))
+            args.omit = Yazbaka._get_timedelta(args.omit)
+
+        # Validate mbuffer sizes (e.g. 1G, 128k), a percentage of memory only makes sense for the buffer size
+        for size, pattern in ((args.mbuffer_size, _RE_MBUFFER_SIZE), (args.mbuffer_block, _RE_MBUFFER_BLOCK)):
+            if not pattern.match(size):
+                msg = "mbuffer size: %s does not appear valid" % size
+                Yazbaka._exit_throw(exit_on_error, msg, msg)
 
-        # Clean up label string
-        if args.label:
-            args.label = args.label.replace("'", "")
+        # Send compressed, embedded and large blocks as-is unless disabled or the destination pool lacks the feature
+        # (last, so invalid arguments are rejected before zpool/zfs are run)
+        if not args.no_compressed_send and destination != "-" and 'w' not in args.send:
+            features = Yazbaka.get_pool_features(destination.split("/")[0])
+            added = ""
+            if 'c' not in args.send and Yazbaka._can_send_compressed(source, 'R' in args.send, features):
+                added += 'c'
+            for flag, feature in (('e', 'embedded_data'), ('L', 'large_blocks')):
+                if flag not in args.send and features.get(feature) in ('enabled', 'active'):
+                    added += flag
+            args.send += added
+            if added and args.verbose:
+                print("Added send flags: " + added)
+        if args.send:
+            args.send = "-" + args.send
 
         args.validated = True
 
@@ -495,23 +861,26 @@ class Yazbaka:
         parser.add_argument('-I', '--full-incremental', help="Full incremental, send all intermittent snapshots (same as using I with zfs send)", action="store_const", const=True)
         parser.add_argument('-n', '--no-cleanup', help="Do not remove any snapshots from the source.", action="store_const", const=True)
         parser.add_argument('-d', '--delete', help="Delete old snapshots on the destination following the same retention policy", action="store_const", const=True)
-        parser.add_argument('-o', '--omit',  help="Skip the snapshot if the most recent snapshot is less than specified time ago",  type=ascii)
+        parser.add_argument('-o', '--omit',  help="Skip the snapshot if the most recent snapshot is less than specified time ago")
         # parser.add_argument('-p', '--progress', help="Show progress", action="store_const", const=True) # Commented out progress argument
         parser.add_argument('-k', '--keep', help="Set the number of matched snapshots to keep on the source (default=5).", type=int, default=5) #eventually add duration to this
-        parser.add_argument('-l', '--label', help="Label used for the snapshot. (default yazbak)", type=ascii, default="yazbak")
-        parser.add_argument('-s', '--send', help=" [DLPRbcehnpsvw] flags to pass to zfs send (see man zfs-send for flag descriptions) ", type=ascii, default="")
-        parser.add_argument('-r', '--recv', '--receive', help="[FhMnsuv] flags to pass to zfs recv (see man zfs-recv for flag descriptions)",  type=ascii, default="")
+        parser.add_argument('-l', '--label', help="Label used for the snapshot. (default yazbak)", default="yazbak")
+        parser.add_argument('-s', '--send', help=" [DLPRbcehnpsvw] flags to pass to zfs send (see man zfs-send for flag descriptions) ", default="")
+        parser.add_argument('--no-compressed-send', help="Do not automatically add the c, e and L flags to zfs send", action="store_const", const=True)
+        parser.add_argument('-r', '--recv', '--receive', help="[FhMnsuv] flags to pass to zfs recv (see man zfs-recv for flag descriptions)", default="")
         parser.add_argument('--snap-only', help="Only take a snapshot, do NOT transfer. Destination should be ommited if this argument is used. (Useful if you want to stop a service before making the snapshot and restart it before send)", action="store_const", const=True)
         parser.add_argument('--transfer-only', help="Only send, do NOT take a snapshot", action="store_const", const=True)
         parser.add_argument('--no-omit-unchanged', help="Still create a snapshot even if no data has been written since the last one.", action="store_const", const=True) # Not implemented
+        parser.add_argument('--parallel', help="Number of datasets to send at once when using a recursive (R) send. Each transfer gets its own mbuffer, so up to this many times --mbuffer-size is used. Clones are received as independent copies of their data (default 1)", type=int, default=1)
+        parser.add_argument('--mbuffer-size', help="Memory used by mbuffer between zfs send and recv (e.g. 512M, 2G or 50%%), per transfer when using --parallel. Validated even if mbuffer is not installed, but only used when it is (default 1G)", default="1G")
+        parser.add_argument('--mbuffer-block', help="Block size used by mbuffer (e.g. 128k or 1M). Validated even if mbuffer is not installed, but only used when it is (default 128k)", default="128k")
         parser.add_argument('--dry-run-cleanup', help="", action="store_const", const=True)
         parser.add_argument('-q', '--quiet', help="Supress all output except errors", action="store_const", const=True)
         parser.add_argument('-v', '--verbose', help="Provide additional output", action="store_const", const=True)
 
-        parser.add_argument('source', help="source dataset (e.g. mypool/dataset)", type=ascii)
-        # Destination argument is conditional; not required if --snap-only is used
-        if "--snap-only" not in sys.argv:
-            parser.add_argument('destination', help="source dataset (e.g. mypool/dataset)", type=ascii)
+        parser.add_argument('source', help="source dataset (e.g. mypool/dataset)")
+        # Destination is optional here, validate_args requires it unless --snap-only is used
+        parser.add_argument('destination', help="destination dataset (e.g. mypool/dataset), omitted when using --snap-only", nargs='?', default=None)
         parser.add_argument('--version', action='version', version='%(prog)s: ' + Yazbaka.VERSION)
         return parser.parse_args()
 
@@ -529,29 +898,12 @@ class Yazbaka:
             cur_time = Yazbaka._get_datetime(snapshot)
             if cur_time < last_time:
                 self._nqprint(f"Deleting: {snapshot}")
-                cmd = f"zfs destroy {snapshot}"
+                cmd = ["zfs", "destroy", snapshot]
                 self._vprint(cmd)
                 if not self.args.dry_run_cleanup:
-                    res = subprocess.run(cmd, capture_output=True, shell=True)
+                    res = subprocess.run(cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
                     if res.returncode != 0:
-                        raise ZFSError(res.stderr.decode())
-
-    @staticmethod
-    def _get_timestamp(string):
-        """
-        Extracts a timestamp string from a given string.
-
-        Args:
-            string (str): The string to extract the timestamp from.
-
-        Returns:
-            str or None: The extracted timestamp string if found, otherwise None.
-        """
-        match = re.search(r"[0-9][0-9\-_T]*$", string)
-        if match is None:
-            return None
-
-        return match.group(0)
+                        raise ZFSError(res.stderr)
 
     @staticmethod
     def _get_datetime(snap_string):
@@ -564,7 +916,7 @@ class Yazbaka:
         Returns:
             datetime or None: The extracted timestamp string if found, otherwise None.
         """
-        match = re.search(r"[0-9][0-9\-_T]*$", snap_string)
+        match = _RE_TS_TAIL.search(snap_string)
         if match is None:
             return None
         timestamp = match.group(0)